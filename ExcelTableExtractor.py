@@ -1,5 +1,8 @@
 import pandas as pd
-from collections import defaultdict
+from openpyxl import Workbook
+
+# Characters Excel does not allow in sheet names
+_SHEET_TRANS = str.maketrans({c: '_' for c in '/\\*[]:?'})
 
 def extract_tables_to_separate_sheets(input_file, output_file):
     """
@@ -25,37 +28,31 @@ def extract_tables_to_separate_sheets(input_file, output_file):
         # Remove rows with missing values
         df = df.dropna()
         
-        # Group column names by table name
-        table_columns = defaultdict(list)
-        
-        for index, row in df.iterrows():
-            table_name = str(row['TableName']).strip()
-            column_name = str(row['ColumnName']).strip()
-            table_columns[table_name].append(column_name)
+        # Group column names by table name (keeps first-seen table order)
+        table_names = df['TableName'].astype(str).str.strip()
+        column_names = df['ColumnName'].astype(str).str.strip()
+        table_columns = column_names.groupby(table_names, sort=False).agg(list).to_dict()
         
         print(f"\nFound {len(table_columns)} unique tables")
         
-        # Create new Excel file with separate sheets
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        # Create new Excel file with separate sheets, streamed row by row
+        wb = Workbook(write_only=True)
+        
+        for table_name, columns in table_columns.items():
+            # Sanitize sheet name (Excel has 31 char limit and special char restrictions)
+            sheet_name = table_name[:31].translate(_SHEET_TRANS)
             
-            for table_name, columns in table_columns.items():
-                # Sanitize sheet name (Excel has 31 char limit and special char restrictions)
-                sheet_name = table_name[:31]
-                sheet_name = sheet_name.replace('/', '_').replace('\\', '_').replace('*', '_')
-                sheet_name = sheet_name.replace('[', '_').replace(']', '_').replace(':', '_')
-                sheet_name = sheet_name.replace('?', '_')
-                
-                # Create a DataFrame with these columns as headers
-                table_df = pd.DataFrame(columns=columns)
-                
-                # Optionally add empty rows for data entry (uncomment if needed)
-                # for i in range(10):
-                #     table_df.loc[i] = [''] * len(columns)
-                
-                # Write to Excel sheet
-                table_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                print(f"  ✓ Created sheet: '{sheet_name}' with {len(columns)} columns")
+            # Write these columns as the header row
+            ws = wb.create_sheet(title=sheet_name)
+            ws.append(columns)
+            
+            # Optionally add empty rows for data entry (uncomment if needed)
+            # for i in range(10):
+            #     ws.append([''] * len(columns))
+            
+            print(f"  ✓ Created sheet: '{sheet_name}' with {len(columns)} columns")
+        
+        wb.save(output_file)
         
         print(f"\n✅ Success! Output saved to: {output_file}")
         print("\nTable Summary:")
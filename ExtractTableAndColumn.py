@@ -1,9 +1,38 @@
+import os
 import re
+import json
 #import cx_Oracle
 import pandas as pd
 from openpyxl import load_workbook
 from collections import defaultdict
 
+# Version of the reference reading logic, part of the .cols.json key; bump it
+# whenever _load_reference_data would read the same workbook differently
+_COLS_CACHE_VERSION = 1
+
+# Comment strippers
+_COMMENT_LINE = re.compile(r'--.*$', re.MULTILINE)
+_COMMENT_BLOCK = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+# Table names after FROM and JOIN
+# Matches: FROM table_name, JOIN schema.table_name
+# Name first, optional '.name' after it: no backtracking over unqualified names
+_FROM_JOIN = re.compile(r'\b(?:FROM|JOIN)\s+([A-Z_][A-Z0-9_]*)(?:\.([A-Z_][A-Z0-9_]*))?')
+
+# WITH clause and the CTE names it defines (name AS ( ... ))
+_WITH = re.compile(r'\bWITH\s+')
+_CTE_NAME = re.compile(r'\b([A-Z_][A-Z0-9_]*)\s+AS\s*\(')
+
+# Keywords that are never column references
+_SQL_KEYWORDS = frozenset({'SELECT', 'FROM', 'WHERE', 'JOIN', 'AND', 'OR', 'ON', 'AS', 'WITH'})
+
+# Column references (table.column or just column); keywords are rejected
+# by the lookahead so they never surface as matches
+_COLUMN_REF = re.compile(
+    r'\b(?!(?:' + '|'.join(sorted(_SQL_KEYWORDS)) + r')\b)'
+    r'([A-Z_][A-Z0-9_]*)(?:\.([A-Z_][A-Z0-9_]*))?\b'
+)
+
 class OracleSQLAnalyzer:
     def __init__(self, connection_string):
         """
@@ -33,87 +62,120 @@ class OracleSQLAnalyzer:
         Extract table names from SQL query including WITH clauses
         """
         # Remove comments
-        sql_query = re.sub(r'--.*$', '', sql_query, flags=re.MULTILINE)
-        sql_query = re.sub(r'/\*.*?\*/', '', sql_query, flags=re.DOTALL)
+        sql_query = _COMMENT_LINE.sub('', sql_query)
+        sql_query = _COMMENT_BLOCK.sub('', sql_query)
         
         # Convert to uppercase for consistent matching
         sql_upper = sql_query.upper()
         
         tables = set()
+        cte_names = self._cte_names(sql_upper)
         
-        # Pattern to match table names after FROM and JOIN
-        # Matches: FROM table_name, JOIN table_name
-        from_pattern = r'\b(?:FROM|JOIN)\s+([A-Z_][A-Z0-9_]*\.)?([A-Z_][A-Z0-9_]*)\s*'
-        
-        matches = re.finditer(from_pattern, sql_upper)
-        for match in matches:
-            schema = match.group(1)
-            table = match.group(2)
+        for match in _FROM_JOIN.finditer(sql_upper):
+            if match.group(2):
+                schema, table = match.group(1), match.group(2)
+            else:
+                schema, table = None, match.group(1)
             
             # Skip CTE names by checking if they're defined in WITH clause
-            if not self._is_cte_name(sql_upper, table):
+            if table not in cte_names:
                 if schema:
-                    tables.add(f"{schema.rstrip('.')}.{table}")
+                    tables.add(f"{schema}.{table}")
                 else:
                     tables.add(table)
         
         return list(tables)
     
-    def _is_cte_name(self, sql_upper, table_name):
-        """Check if a name is a CTE (Common Table Expression)"""
+    def _cte_names(self, sql_upper):
+        """Collect all CTE (Common Table Expression) names in one pass"""
         # Look for WITH clause definitions
-        cte_pattern = r'\bWITH\s+.*?\b' + table_name + r'\s+AS\s*\('
-        return bool(re.search(cte_pattern, sql_upper, re.DOTALL))
+        with_match = _WITH.search(sql_upper)
+        if not with_match:
+            return frozenset()
+        return frozenset(_CTE_NAME.findall(sql_upper, with_match.end()))
     
     def get_table_columns(self, table_name):
         """
         Execute DESC equivalent to get column details
         Returns: DataFrame with column details
         """
+        return self.get_tables_columns([table_name])[table_name]
+    
+    def get_tables_columns(self, table_names):
+        """
+        Execute DESC equivalent for several tables in one round trip
+        (one query per 1000 tables, Oracle's IN list limit)
+        Returns: {table_name: DataFrame with column details}
+        """
         if not self.conn:
             raise Exception("Not connected to database")
         
+        # Extract just table name if schema.table format
+        tables_by_name = defaultdict(list)
+        for table_name in table_names:
+            tables_by_name[table_name.rpartition('.')[2].upper()].append(table_name)
+        
+        columns_by_name = {}
+        names = list(tables_by_name)
         cursor = self.conn.cursor()
         
         try:
-            # Query to get column information (equivalent to DESC)
-            query = """
-                SELECT 
-                    COLUMN_NAME,
-                    DATA_TYPE,
-                    DATA_LENGTH,
-                    DATA_PRECISION,
-                    DATA_SCALE,
-                    NULLABLE
-                FROM ALL_TAB_COLUMNS
-                WHERE TABLE_NAME = :table_name
-                ORDER BY COLUMN_ID
-            """
-            
-            # Extract just table name if schema.table format
-            parts = table_name.split('.')
-            table_only = parts[-1] if len(parts) > 1 else table_name
-            
-            cursor.execute(query, {'table_name': table_only.upper()})
-            
-            columns = []
-            for row in cursor:
-                columns.append({
-                    'Column Name': row[0],
-                    'Data Type': row[1],
-                    'Length': row[2],
-                    'Precision': row[3],
-                    'Scale': row[4],
-                    'Nullable': row[5]
-                })
-            
-            return pd.DataFrame(columns)
-            
-        except Exception as e:
-            print(f"Error getting columns for {table_name}: {e}")
-            return pd.DataFrame()
+            for start in range(0, len(names), 1000):
+                batch = names[start:start + 1000]
+                try:
+                    columns_by_name.update(self._query_columns(cursor, batch))
+                except Exception:
+                    # Retry one table at a time, so a failure only loses that table's columns
+                    for name in batch:
+                        try:
+                            columns_by_name.update(self._query_columns(cursor, [name]))
+                        except Exception as e:
+                            print(f"Error getting columns for {name}: {e}")
         finally:
             cursor.close()
+        
+        return {
+            table_name: pd.DataFrame(columns_by_name.get(name, []))
+            for name, tables in tables_by_name.items()
+            for table_name in tables
+        }
+    
+    def _query_columns(self, cursor, names):
+        """
+        Query ALL_TAB_COLUMNS for a list of (unqualified, uppercase) table names
+        Returns: {TABLE_NAME: [column detail dicts]}
+        """
+        binds = {f'name{i}': name for i, name in enumerate(names)}
+        
+        # Query to get column information (equivalent to DESC)
+        query = f"""
+            SELECT 
+                TABLE_NAME,
+                COLUMN_NAME,
+                DATA_TYPE,
+                DATA_LENGTH,
+                DATA_PRECISION,
+                DATA_SCALE,
+                NULLABLE
+            FROM ALL_TAB_COLUMNS
+            WHERE TABLE_NAME IN ({', '.join(':' + key for key in binds)})
+            ORDER BY TABLE_NAME, COLUMN_ID
+        """
+        
+        cursor.execute(query, binds)
+        
+        columns_by_name = defaultdict(list)
+        for row in cursor:
+            columns_by_name[row[0]].append({
+                'Column Name': row[1],
+                'Data Type': row[2],
+                'Length': row[3],
+                'Precision': row[4],
+                'Scale': row[5],
+                'Nullable': row[6]
+            })
+        
+        return columns_by_name
     
     def create_reference_excel(self, sql_query, output_file='table_reference.xlsx'):
         """
@@ -127,10 +189,15 @@ class OracleSQLAnalyzer:
         
         print(f"Found {len(tables)} tables: {tables}")
         
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        # Fetch every table's columns up front instead of one query per table
+        columns_by_table = self.get_tables_columns(tables)
+        
+        # xlsxwriter writes faster than openpyxl; constant_memory is left off
+        # because pandas writes cells column by column, not row by row
+        with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
             for table in tables:
                 print(f"Processing table: {table}")
-                df = self.get_table_columns(table)
+                df = columns_by_table[table]
                 
                 if not df.empty:
                     # Excel sheet names have max 31 characters
@@ -142,44 +209,81 @@ class OracleSQLAnalyzer:
         
         print(f"\nReference Excel file created: {output_file}")
     
+    def _load_reference_data(self, reference_excel):
+        """
+        Load {sheet: [column names]} from the reference Excel.
+        Cached as JSON next to the workbook and rebuilt when the workbook's
+        modification time or size (or _COLS_CACHE_VERSION) changes.
+        """
+        cache_file = reference_excel + '.cols.json'
+        key = [_COLS_CACHE_VERSION, os.path.getmtime(reference_excel), os.path.getsize(reference_excel)]
+        
+        if os.path.exists(cache_file):
+            # A stale or damaged cache falls through to re-reading the workbook
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached['key'] == key and isinstance(cached['sheets'], dict):
+                    return cached['sheets']
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        
+        # One call reads every sheet from a single parse of the workbook;
+        # only the 'Column Name' column is needed, skip the other details
+        sheets = pd.read_excel(reference_excel, sheet_name=None, usecols=['Column Name'])
+        reference_data = {sheet: df['Column Name'].tolist() for sheet, df in sheets.items()}
+        
+        # Replace the cache in one step (never half-written); if the workbook's
+        # folder is read-only the data is still returned, just not cached
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'sheets': reference_data}, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"Could not write cache {cache_file}: {e}")
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        
+        return reference_data
+    
     def analyze_query_with_reference(self, sql_query, reference_excel='table_reference.xlsx'):
         """
         Analyze SQL query and provide table-column mapping using reference Excel
         """
         # Load reference data
-        excel_file = pd.ExcelFile(reference_excel)
-        reference_data = {}
-        
-        for sheet in excel_file.sheet_names:
-            df = pd.read_excel(excel_file, sheet_name=sheet)
-            reference_data[sheet] = df['Column Name'].tolist()
+        reference_data = self._load_reference_data(reference_excel)
         
         # Extract tables from query
         tables_in_query = self.extract_table_names(sql_query)
         
         # Extract column references from query
         sql_upper = sql_query.upper()
-        # Pattern to match column references (table.column or just column)
-        column_pattern = r'\b([A-Z_][A-Z0-9_]*\.)?([A-Z_][A-Z0-9_]*)\b'
         
-        potential_columns = set()
-        for match in re.finditer(column_pattern, sql_upper):
-            if match.group(2) not in ['SELECT', 'FROM', 'WHERE', 'JOIN', 'AND', 'OR', 'ON', 'AS', 'WITH']:
-                potential_columns.add(match.group(0))
+        potential_columns = {match.group(0) for match in _COLUMN_REF.finditer(sql_upper)}
         
-        # Match columns with tables
-        results = defaultdict(list)
+        # Index reference columns back to the sheets that define them
+        col_to_sheets = defaultdict(list)
+        for sheet, columns in reference_data.items():
+            for col_name in set(columns):
+                col_to_sheets[col_name].append(sheet)
         
+        sheet_to_tables = defaultdict(list)
         for table in tables_in_query:
-            table_key = table[:31]  # Match sheet name truncation
-            if table_key in reference_data:
-                for col in potential_columns:
-                    # Extract column name without table prefix
-                    col_name = col.split('.')[-1]
-                    if col_name in reference_data[table_key]:
-                        results[table].append(col_name)
-        
-        return dict(results)
+            sheet_to_tables[table[:31]].append(table)  # Match sheet name truncation
+        
+        # Match columns with tables (a set per referenced table, so each column is listed once)
+        results = {table: set() for table in tables_in_query if table[:31] in reference_data}
+        
+        for col in potential_columns:
+            # Extract column name without table prefix
+            col_name = col.rpartition('.')[2]
+            for sheet in col_to_sheets.get(col_name, ()):
+                for table in sheet_to_tables.get(sheet, ()):
+                    results[table].add(col_name)
+        
+        return {table: sorted(cols) for table, cols in results.items() if cols}
 
 
 # Example usage
@@ -1,26 +1,122 @@
+import os
+import sys
 import pandas as pd
 import re
+import json
+import mmap
+from openpyxl import load_workbook
 from collections import defaultdict
+from functools import lru_cache
 
-def load_table_reference(reference_file):
+# Optional: python-calamine (Rust) reads xlsx much faster than openpyxl
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Version of the header reading logic, part of the .headers.json key; bump it
+# whenever load_table_reference would read the same workbook differently
+_HEADERS_CACHE_VERSION = 2
+
+# Size from which read_sql_file maps the file instead of reading it
+_MMAP_THRESHOLD = 10 * 1024 * 1024
+
+# Comments and string literals, stripped in a single pass. Group 1 is the
+# opening quote of a literal ('' inside a literal is an escaped quote). The
+# leading lookahead rules out most positions with a single character test
+_COMMENTS_AND_LITERALS = re.compile(r"(?=[-/'])(?:--[^\n]*|/\*.*?\*/|(')[^']*(?:''[^']*)*')", re.DOTALL)
+
+# Whitespace runs
+_WHITESPACE = re.compile(r'\s+')
+
+# Word runs: a plain-word name matches \bNAME\b exactly when it is one of these
+_WORD = re.compile(r'\w+')
+
+def _scrub(match):
+    """Replacement for _COMMENTS_AND_LITERALS: drop comments, turn each literal into ''"""
+    return "''" if match.group(1) else ''
+
+
+def _header_name(cell):
+    """Column name for a header cell; calamine reads 2023 as 2023.0, openpyxl as 2023"""
+    if isinstance(cell, float) and cell.is_integer():
+        cell = int(cell)
+    return str(cell)
+
+
+def _read_sheet_headers(reference_file):
+    """
+    Yield (sheet_name, header_row) for every sheet in the reference Excel.
+    Only the first row of each sheet is read.
+    """
+    if CalamineWorkbook is not None:
+        with CalamineWorkbook.from_path(reference_file) as wb:
+            for sheet_name in wb.sheet_names:
+                rows = wb.get_sheet_by_name(sheet_name).to_python(nrows=1)
+                yield sheet_name, rows[0] if rows else []
+        return
+    
+    wb = load_workbook(reference_file, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            yield ws.title, next(ws.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+
+
+def load_table_reference(reference_file, use_cache=True):
     """
     Load table and column information from the reference Excel file.
     Returns a dictionary: {table_name: [list of columns]}
+    
+    The result is cached as JSON next to the workbook and reused while the
+    workbook's modification time and size (and _HEADERS_CACHE_VERSION) are
+    unchanged; pass use_cache=False to ignore the cache and rebuild it from
+    the workbook.
     """
     print(f"Loading table reference from: {reference_file}")
     
-    table_reference = {}
+    cache_file = reference_file + '.headers.json'
+    table_reference = None
     
     try:
-        # Read all sheets from the reference Excel
-        excel_file = pd.ExcelFile(reference_file)
+        key = [_HEADERS_CACHE_VERSION, os.path.getmtime(reference_file), os.path.getsize(reference_file)]
         
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(reference_file, sheet_name=sheet_name)
-            # Get column names from the sheet
-            columns = df.columns.tolist()
-            table_reference[sheet_name] = columns
-            print(f"  ✓ Loaded table: {sheet_name} with {len(columns)} columns")
+        if use_cache and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached['key'] == key and isinstance(cached['tables'], dict):
+                    table_reference = cached['tables']
+                    print(f"  ✓ Loaded from cache: {cache_file}")
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+            
+            if table_reference is None:
+                print(f"  Ignoring stale or damaged cache: {cache_file}")
+        
+        if table_reference is None:
+            table_reference = {}
+            
+            # Read only the header row of each sheet from the reference Excel
+            for sheet_name, header in _read_sheet_headers(reference_file):
+                # Get column names from the sheet (calamine reports empty cells as '')
+                columns = [_header_name(c) for c in header if c not in (None, '')]
+                table_reference[sheet_name] = columns
+                print(f"  ✓ Loaded table: {sheet_name} with {len(columns)} columns")
+            
+            # (Re)write the cache through a temporary file, so it is never left
+            # half-written; failing to write it only costs the next run a re-read
+            tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'key': key, 'tables': table_reference}, f)
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                print(f"  Could not write cache {cache_file}: {e}")
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
         
         print(f"\nTotal tables loaded: {len(table_reference)}")
         return table_reference
@@ -30,13 +126,36 @@ def load_table_reference(reference_file):
         return {}
 
 
+def _index_reference(table_reference):
+    """
+    Index a table reference by uppercase name, the form the extractor matches on.
+    Returns a dictionary: {TABLE_NAME: (table_name, {COLUMN_NAME: column_name})}
+    
+    The uppercase keys are interned, as they are what every lookup goes
+    through. A header repeating a column keeps its first spelling.
+    """
+    index = {}
+    for table_name, columns in table_reference.items():
+        column_map = {}
+        for column in columns:
+            column_map.setdefault(sys.intern(column.upper()), column)
+        index[sys.intern(table_name.upper())] = (table_name, column_map)
+    return index
+
+
 def read_sql_file(sql_file_path):
     """
-    Read SQL query from file.
+    Read SQL query from file (memory-mapped from _MMAP_THRESHOLD up).
+    CRLF and CR line endings become LF on both paths, as text mode does.
     """
     try:
-        with open(sql_file_path, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
+        if os.path.getsize(sql_file_path) < _MMAP_THRESHOLD:
+            with open(sql_file_path, 'r', encoding='utf-8') as f:
+                sql_content = f.read()
+        else:
+            with open(sql_file_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    sql_content = str(mm, 'utf-8').replace('\r\n', '\n').replace('\r', '\n')
         print(f"✓ SQL file loaded: {sql_file_path}")
         return sql_content
     except Exception as e:
@@ -44,77 +163,128 @@ def read_sql_file(sql_file_path):
         return ""
 
 
-def extract_table_column_from_sql(sql_query, table_reference):
+@lru_cache(maxsize=32)
+def _names_regex(names):
+    """
+    Compile one alternation matching any of the names (a tuple, longest first).
+    The alternation sits in a lookahead, so a match consumes no text and names
+    that overlap (HR.EMP and EMP, EMP$X and EMP) are each still found.
+    Cached, so a fixed reference is only compiled once however many queries use it.
+    """
+    return re.compile(r'(?=\b(' + '|'.join(map(re.escape, names)) + r')\b)', re.IGNORECASE)
+
+
+def _find_names(sql_text, names):
+    """
+    Return the (uppercase) names that occur as whole words in the SQL, in any case.
+    All names go into one alternation (longest first), so the SQL is scanned once.
+    """
+    names = tuple(sorted({n for n in names if n}, key=lambda n: (-len(n), n)))
+    if not names:
+        return set()
+    
+    found = {m.group(1).upper() for m in _names_regex(names).finditer(sql_text)}
+    
+    # Where several names start at the same place only the longest is reported;
+    # a shorter name that is a prefix of a found one (HR.EMP of HR.EMP$X) is checked on its own
+    for name in names:
+        if name not in found and any(f.startswith(name) for f in found):
+            if re.search(r'\b' + re.escape(name) + r'\b', sql_text, re.IGNORECASE):
+                found.add(name)
+    
+    return found
+
+
+def _match_names(sql_text, words_in_sql, names):
+    """
+    Return the (uppercase) names that occur as whole words in the SQL.
+    Plain-word names are set lookups against the query's words; only names with
+    other characters (dots, #, $) go through the _find_names scan.
+    """
+    found = words_in_sql.intersection(names)
+    return found | _find_names(
+        sql_text, (n for n in names if n not in found and not _WORD.fullmatch(n))
+    )
+
+
+def extract_table_column_from_sql(sql_query, table_reference, verbose=False):
     """
     Extract table names and column names from SQL query using the reference.
     Returns a dictionary: {table_name: [list of columns found in query]}
+    With verbose=True every match is also listed, in one write after matching.
     """
+    reference_index = _index_reference(table_reference)
+    
     results = defaultdict(list)
+    log = []
     
-    # Convert SQL to uppercase for easier matching
-    sql_upper = sql_query.upper()
+    # Remove comments and string literals (no false matches on quoted text) from SQL.
+    # Names are matched case-insensitively, so no uppercased copy of the query is needed
+    sql_text = _COMMENTS_AND_LITERALS.sub(_scrub, sql_query)
     
-    # Remove comments from SQL
-    sql_upper = re.sub(r'--.*?$', '', sql_upper, flags=re.MULTILINE)
-    sql_upper = re.sub(r'/\*.*?\*/', '', sql_upper, flags=re.DOTALL)
+    # Collapse whitespace
+    sql_text = _WHITESPACE.sub(' ', sql_text)
     
     print("\nAnalyzing SQL query...")
     
-    # For each table in reference
-    for table_name, columns in table_reference.items():
-        table_upper = table_name.upper()
+    # The query's words, shared by the table and column lookups
+    words_in_sql = {w.upper() for w in _WORD.findall(sql_text)}
+    
+    # All table names at once, instead of a separate search per table
+    tables_found = _match_names(sql_text, words_in_sql, reference_index)
+    tables_in_sql = [reference_index[t] for t in reference_index if t in tables_found]
+    
+    # Then the columns of those tables only
+    columns_found = _match_names(
+        sql_text, words_in_sql, {c for _, columns in tables_in_sql for c in columns}
+    )
+    
+    # For each table referenced in SQL
+    for table_name, columns in tables_in_sql:
+        if verbose:
+            log.append(f"\n  Found table: {table_name}")
         
-        # Check if table is referenced in SQL
-        # Look for table name in FROM, JOIN clauses
-        table_pattern = r'\b' + re.escape(table_upper) + r'\b'
-                
-        if re.search(table_pattern, sql_upper):
-            print(f"\n  Found table: {table_name}")
-            
-            # For each column in this table, check if it's in the SQL
-            for column in columns:
-                column_upper = column.upper()
-                
-                # Look for column references (with or without table prefix)
-                # Pattern 1: table.column
-                pattern1 = r'\b' + re.escape(table_upper) + r'\.\s*' + re.escape(column_upper) + r'\b'
-                # Pattern 2: just column name (if unique enough)
-                pattern2 = r'\b' + re.escape(column_upper) + r'\b'
-                
-                if re.search(pattern1, sql_upper) or re.search(pattern2, sql_upper):
-                    results[table_name].append(column)
-                    print(f"    ✓ Column: {column}")
+        # For each column in this table, check if it's in the SQL
+        # (a table.column reference always contains the bare column name too)
+        for column_upper, column in columns.items():
+            if column_upper in columns_found:
+                results[table_name].append(column)
+                if verbose:
+                    log.append(f"    ✓ Column: {column}")
+    
+    if log:
+        print('\n'.join(log))
     
     return dict(results)
 
 
 def save_results_to_excel(results, output_file):
     """
-    Save extraction results to Excel file.
+    Save extraction results to Excel file (or Parquet, if output_file ends in .parquet).
     Format: TableName | ColumnName
     """
     try:
-        data = []
+        # One list per output column rather than one dict per row
+        table_names = []
+        column_names = []
         
         for table_name, columns in results.items():
-            for column in columns:
-                data.append({
-                    'TableName': table_name,
-                    'ColumnName': column
-                })
+            table_names.extend([table_name] * len(columns))
+            column_names.extend(columns)
         
-        if not data:
+        if not column_names:
             print("\n⚠️  No tables/columns found in SQL query!")
-            # Create empty DataFrame
-            df = pd.DataFrame(columns=['TableName', 'ColumnName'])
-        else:
-            df = pd.DataFrame(data)
         
-        # Save to Excel
-        df.to_excel(output_file, index=False, sheet_name='SQL_Analysis')
+        df = pd.DataFrame({'TableName': table_names, 'ColumnName': column_names})
+        
+        if output_file.endswith('.parquet'):
+            df.to_parquet(output_file, index=False, compression='zstd')
+        else:
+            # Save to Excel
+            df.to_excel(output_file, index=False, sheet_name='SQL_Analysis', engine='xlsxwriter')
         
         print(f"\n✅ Results saved to: {output_file}")
-        print(f"   Total rows: {len(data)}")
+        print(f"   Total rows: {len(column_names)}")
         
         return True
         
@@ -123,7 +293,7 @@ def save_results_to_excel(results, output_file):
         return False
 
 
-def analyze_sql_query(reference_file, sql_file, output_file):
+def analyze_sql_query(reference_file, sql_file, output_file, use_cache=True):
     """
     Main function to analyze SQL query and extract table/column information.
     """
@@ -132,7 +302,7 @@ def analyze_sql_query(reference_file, sql_file, output_file):
     print("=" * 70 + "\n")
     
     # Step 1: Load table reference
-    table_reference = load_table_reference(reference_file)
+    table_reference = load_table_reference(reference_file, use_cache)
     
     if not table_reference:
         print("❌ Failed to load table reference. Exiting.")
@@ -182,7 +352,8 @@ if __name__ == "__main__":
     # CONFIGURE THESE PATHS
     REFERENCE_EXCEL = "output_separated_tables.xlsx"  # Table reference file
     SQL_INPUT_FILE = "complex_oracle_query.sql"                       # Your Oracle SQL file
-    OUTPUT_EXCEL = "sql_analysis_result.xlsx"          # Output results file
+    OUTPUT_EXCEL = "sql_analysis_result.xlsx"          # Output results file (.xlsx or .parquet)
+    USE_CACHE = True                                   # False to re-read the reference Excel and refresh its cache
     
     # Run the analysis
-    analyze_sql_query(REFERENCE_EXCEL, SQL_INPUT_FILE, OUTPUT_EXCEL)
+    analyze_sql_query(REFERENCE_EXCEL, SQL_INPUT_FILE, OUTPUT_EXCEL, USE_CACHE)
@@ -1,7 +1,64 @@
-from sql_metadata import Parser
+import os
 import re
+import json
+import mmap
 from collections import Counter
 
+# Version of the counting logic, part of the .parsecache.json key; bump it
+# whenever extract_columns_from_query would count the same SQL differently
+_PARSE_CACHE_VERSION = 3
+
+# Files at least this large are decoded straight from a memory map
+_MMAP_THRESHOLD = 10 * 1024 * 1024
+
+# Comments and string literals (group 1 marks a literal), removed in one pass
+_COMMENTS_AND_LITERALS = re.compile(r"(?=[-/'])(?:--[^\n]*|/\*.*?\*/|(')[^']*(?:''[^']*)*')", re.DOTALL)
+
+# Pattern to match table.column or alias.column or just column
+# Matches: table.column, alias.column, or standalone column names
+# (name first, optional '.name' after it, so unqualified names never backtrack)
+_COLUMN_REF = re.compile(r'\b([A-Z_][A-Z0-9_]*)(?:\.([A-Z_][A-Z0-9_]*))?\b')
+
+# SQL keywords to exclude
+_SQL_KEYWORDS = frozenset({
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'EXISTS',
+    'JOIN', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'CROSS', 'FULL',
+    'ON', 'AS', 'ORDER', 'BY', 'GROUP', 'HAVING', 'LIMIT',
+    'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP',
+    'TABLE', 'VIEW', 'INDEX', 'DATABASE', 'SCHEMA',
+    'IS', 'NULL', 'BETWEEN', 'LIKE', 'DISTINCT', 'ALL', 'ANY',
+    'UNION', 'INTERSECT', 'MINUS', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END',
+    'ASC', 'DESC', 'INTO', 'VALUES', 'SET', 'ROWNUM', 'DUAL',
+    'CONNECT', 'START', 'WITH', 'PRIOR', 'LEVEL', 'SYSDATE',
+    'COUNT', 'SUM', 'AVG', 'MAX', 'MIN', 'DECODE', 'NVL', 'TO_DATE',
+    'TO_CHAR', 'TO_NUMBER', 'TRUNC', 'ROUND', 'SUBSTR', 'LENGTH',
+    'UPPER', 'LOWER', 'TRIM', 'LTRIM', 'RTRIM', 'REPLACE',
+    'PARTITION', 'OVER', 'ROW_NUMBER', 'RANK', 'DENSE_RANK'
+})
+
+def _scrub(match):
+    """Drop a comment, or replace a string literal with ''."""
+    return "''" if match.group(1) else ''
+
+
+def _iter_columns(sql_query):
+    """
+    Yield every column reference in an SQL query.
+    
+    Args:
+        sql_query (str): The uppercased SQL query, without comments or literals
+        
+    Yields:
+        str: Full column name (with table/alias prefix if present)
+    """
+    for match in _COLUMN_REF.finditer(sql_query):
+        prefix, column = match.groups()
+        
+        # Skip SQL keywords (the last name part is the column)
+        if (column or prefix) not in _SQL_KEYWORDS:
+            yield match.group(0)
+
+
 def extract_columns_from_query(sql_query):
     """
     Extract table columns and their counts from an Oracle SQL query.
@@ -12,62 +69,83 @@ def extract_columns_from_query(sql_query):
     Returns:
         dict: Dictionary with column names as keys and their counts as values
     """
-    # Remove comments
-    sql_query = re.sub(r'--.*?$', '', sql_query, flags=re.MULTILINE)
-    sql_query = re.sub(r'/\*.*?\*/', '', sql_query, flags=re.DOTALL)
-    
-    # Remove string literals to avoid false matches
-    sql_query = re.sub(r"'[^']*'", "''", sql_query)
-    
-    # Convert to uppercase for easier parsing
-    sql_upper = sql_query.upper()
-    
-    # List to store all column references
-    columns = []
-    
-    # Pattern to match table.column or alias.column or just column
-    # Matches: table.column, alias.column, or standalone column names
-    column_pattern = r'\b([A-Z_][A-Z0-9_]*\.)?([A-Z_][A-Z0-9_]*)\b'
-    
-    # Find all potential column references
-    matches = re.findall(column_pattern, sql_upper)
-    
-    # SQL keywords to exclude
-    sql_keywords = {
-        'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'EXISTS',
-        'JOIN', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'CROSS', 'FULL',
-        'ON', 'AS', 'ORDER', 'BY', 'GROUP', 'HAVING', 'LIMIT',
-        'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP',
-        'TABLE', 'VIEW', 'INDEX', 'DATABASE', 'SCHEMA',
-        'IS', 'NULL', 'BETWEEN', 'LIKE', 'DISTINCT', 'ALL', 'ANY',
-        'UNION', 'INTERSECT', 'MINUS', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END',
-        'ASC', 'DESC', 'INTO', 'VALUES', 'SET', 'ROWNUM', 'DUAL',
-        'CONNECT', 'START', 'WITH', 'PRIOR', 'LEVEL', 'SYSDATE',
-        'COUNT', 'SUM', 'AVG', 'MAX', 'MIN', 'DECODE', 'NVL', 'TO_DATE',
-        'TO_CHAR', 'TO_NUMBER', 'TRUNC', 'ROUND', 'SUBSTR', 'LENGTH',
-        'UPPER', 'LOWER', 'TRIM', 'LTRIM', 'RTRIM', 'REPLACE',
-        'PARTITION', 'OVER', 'ROW_NUMBER', 'RANK', 'DENSE_RANK'
-    }
-    
-    for prefix, column in matches:
-        # Skip SQL keywords
-        if column in sql_keywords:
-            continue
-            
-        # Build full column name (with table/alias prefix if present)
-        if prefix:
-            full_column = f"{prefix.rstrip('.')}.{column}"
-        else:
-            full_column = column
-            
-        columns.append(full_column)
+    # Remove comments, and string literals to avoid false matches, then
+    # uppercase the scrubbed copy for consistent matching
+    sql_query = _COMMENTS_AND_LITERALS.sub(_scrub, sql_query).upper()
     
     # Count occurrences
-    column_counts = Counter(columns)
+    column_counts = Counter(_iter_columns(sql_query))
     
     return dict(column_counts)
 
 
+def read_sql_file(sql_file):
+    """
+    Read an SQL file as text.
+    
+    Large files are decoded directly from a read-only memory map, so the raw
+    bytes are never copied into a separate buffer first. CRLF and CR line
+    endings become LF either way, as text mode does for small files.
+    
+    Args:
+        sql_file (str): Path to the SQL file
+        
+    Returns:
+        str: The SQL text
+    """
+    if os.path.getsize(sql_file) < _MMAP_THRESHOLD:
+        with open(sql_file, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    with open(sql_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def extract_columns_from_file(sql_file, cache=True):
+    """
+    Extract table columns and their counts from an Oracle SQL file.
+    
+    Args:
+        sql_file (str): Path to the SQL file
+        cache (bool): Reuse the counts saved next to the file while its
+            modification time and size (and _PARSE_CACHE_VERSION) are unchanged
+        
+    Returns:
+        dict: Dictionary with column names as keys and their counts as values
+    """
+    cache_file = sql_file + '.parsecache.json'
+    key = [_PARSE_CACHE_VERSION, os.path.getmtime(sql_file), os.path.getsize(sql_file)]
+    
+    if cache and os.path.exists(cache_file):
+        # An unreadable or damaged cache is treated as a miss and rebuilt
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached['key'] == key:
+                return cached['columns']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    
+    column_counts = extract_columns_from_query(read_sql_file(sql_file))
+    
+    if cache:
+        # Write to a temporary file and move it into place, so an interrupted
+        # write never leaves a truncated cache; the counts are returned either way
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'columns': column_counts}, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"Could not write cache {cache_file}: {e}")
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    
+    return column_counts
+
+
 def display_results(column_counts):
     """
     Display the column counts in a formatted way.
@@ -123,11 +201,8 @@ if __name__ == "__main__":
     print("Analyzing SQL Query:")
     #print(sample_query)
 
-    with open("complex_oracle_query.sql", 'r', encoding='utf-8') as f:
-            sample_query = f.read()
-    
     # Extract columns and their counts
-    result = extract_columns_from_query(sample_query)
+    result = extract_columns_from_file("complex_oracle_query.sql")
     
     # Display results
     display_results(result)